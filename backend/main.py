@@ -1,7 +1,8 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Dict
 import torch
 from PIL import Image
 import io
@@ -10,6 +11,8 @@ import numpy as np
 from transformers import pipeline
 from sentence_transformers import SentenceTransformer
 import faiss
+from multipart.multipart import MultipartParser, parse_options_header
+from multipart.exceptions import MultipartParseError
 import os
 from dotenv import load_dotenv
 from langchain_community.llms import HuggingFaceHub
@@ -17,31 +20,227 @@ from langchain.prompts import PromptTemplate
 import uuid
 from contextlib import asynccontextmanager
 import logging
+import tempfile
+import threading
+import time
 from mangum import Mangum
 
 # Load environment variables
 load_dotenv()
 
+# Models used for captioning and embeddings; every stored analysis is tagged
+# with the names that produced it so a re-index can find stale entries
+CAPTION_MODEL_NAME = os.getenv("CAPTION_MODEL", "nlpconnect/vit-gpt2-image-captioning")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "clip-ViT-B-32")
+REINDEX_BATCH_SIZE = int(os.getenv("REINDEX_BATCH_SIZE", "16"))
+
+# Upload limits; uploads are streamed into spooled temp files and checked as
+# they arrive so concurrent large uploads don't each hold their whole body in memory
+MAX_FILE_BYTES = int(os.getenv("MAX_UPLOAD_FILE_BYTES", str(10 * 1024 * 1024)))
+MAX_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_BYTES", str(50 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(40_000_000)))
+SPOOL_MAX_MEMORY_BYTES = 1024 * 1024
+UPLOAD_CHUNK_BYTES = 192 * 1024  # Multiple of 3 so base64 chunks need no padding
+HEADER_SNIFF_BYTES = 4 * 1024
+
 # Store uploaded images and their analysis
 uploaded_images = {}
 
+# Guards uploaded_images, the active captioner and the active search index so
+# a background re-index can swap them without racing concurrent uploads
+index_lock = threading.Lock()
+
+# Progress of the background re-index
+reindex_state = {
+    "running": False,
+    "caption_model": None,
+    "embedding_model": None,
+    "processed": {"caption": 0, "embedding": 0},
+    "errors": [],
+    "unsearchable": [],  # Image IDs left out of the index by the last re-index
+    "started_at": None,
+    "finished_at": None
+}
+
+def embedding_dimension(clip_model) -> int:
+    """Size of the vectors produced by clip_model.
+
+    CLIP checkpoints load as a single CLIPModel module that does not report a
+    sentence embedding dimension, so encode a probe input instead.
+    """
+    return len(clip_model.encode("dimension probe"))
+
+def build_search_index(clip_model, model_name: str) -> Dict:
+    """Create an empty FAISS index bundled with the model that fills it.
+
+    The bundle is swapped as a whole, so queries are always encoded with the
+    same model as the vectors they are searched against.
+    """
+    return {
+        "model_name": model_name,
+        "clip_model": clip_model,
+        "index": faiss.IndexFlatL2(embedding_dimension(clip_model)),
+        "image_ids": []  # FAISS position -> image ID
+    }
+
+def sniff_image_format(head: bytes) -> str:
+    """Identify a supported image format from its magic bytes"""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    raise ValueError("Unsupported image format")
+
+def check_image_dimensions(head: bytes):
+    """Reject images whose header declares more than MAX_IMAGE_PIXELS"""
+    try:
+        width, height = Image.open(io.BytesIO(head)).size
+    except Exception:
+        # Dimensions lie past the sniffed bytes; open_spooled_image checks them
+        return
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValueError(f"Image is too large: {width}x{height} pixels")
+
+def check_image_header(head: bytes) -> str:
+    """Reject unsupported or oversized images from their first few KB"""
+    image_format = sniff_image_format(head)
+    check_image_dimensions(head)
+    return image_format
+
+async def spool_multipart_images(request: Request) -> List[UploadFile]:
+    """Stream a multipart body into one spooled temp file per file part.
+
+    Each part is checked while it arrives: its header once the first
+    HEADER_SNIFF_BYTES are in, its size on every chunk. An unsupported or
+    oversized image aborts the request before the rest of the body is read.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    uploads: List[UploadFile] = []
+    state = {"part": None, "head": None, "headers": {}, "field": b"", "value": b""}
+
+    def check_head():
+        upload, head = state["part"], state["head"]
+        state["head"] = None
+        try:
+            sniff_image_format(head)
+        except ValueError as e:
+            raise HTTPException(status_code=415, detail=f"{upload.filename}: {str(e)}")
+        try:
+            check_image_dimensions(head)
+        except ValueError as e:
+            raise HTTPException(status_code=413, detail=f"{upload.filename}: {str(e)}")
+
+    def on_part_begin():
+        state["part"] = None
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"] = state["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        # Plain form fields and empty file inputs carry no filename and are skipped
+        if options.get(b"filename"):
+            upload = UploadFile(
+                tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY_BYTES),
+                size=0,
+                filename=options[b"filename"].decode("utf-8", "replace")
+            )
+            uploads.append(upload)
+            state["part"] = upload
+            state["head"] = b""
+
+    def on_part_data(data, start, end):
+        upload = state["part"]
+        if upload is None:
+            return
+        chunk = data[start:end]
+        upload.size += len(chunk)
+        if upload.size > MAX_FILE_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{upload.filename}: file exceeds the {MAX_FILE_BYTES} byte limit"
+            )
+        if state["head"] is not None:
+            state["head"] += chunk
+            if len(state["head"]) >= HEADER_SNIFF_BYTES:
+                check_head()
+        upload.file.write(chunk)
+
+    def on_part_end():
+        # Parts smaller than HEADER_SNIFF_BYTES are checked once complete
+        if state["part"] is not None and state["head"] is not None:
+            check_head()
+        state["part"] = None
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except Exception as e:
+        for upload in uploads:
+            upload.file.close()
+        if isinstance(e, MultipartParseError):
+            raise HTTPException(status_code=400, detail=f"Malformed multipart body: {str(e)}")
+        raise
+    return uploads
+
+def open_spooled_image(spooled):
+    """Decode an image straight from its spooled file"""
+    spooled.seek(0)
+    image = Image.open(spooled)
+    if image.width * image.height > MAX_IMAGE_PIXELS:
+        raise ValueError(f"Image is too large: {image.width}x{image.height} pixels")
+    image.load()
+    return image
+
+def encode_spooled_base64(spooled) -> str:
+    """Base64-encode a spooled file in chunks into a single string"""
+    spooled.seek(0)
+    chunks = []
+    while True:
+        chunk = spooled.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        chunks.append(base64.b64encode(chunk).decode('utf-8'))
+    return "".join(chunks)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Initialize ML models
-    global object_detector, image_captioner, clip_model, faiss_index, llm
+    global object_detector, image_captioner, caption_model, search_index, llm
     
     try:
         # Initialize YOLOv5 for object detection (will download if not cached)
         object_detector = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=True, force_reload=True)
         
         # Initialize image captioning model (will download if not cached)
-        image_captioner = pipeline("image-to-text", model="nlpconnect/vit-gpt2-image-captioning")
-        
-        # Initialize CLIP for image embeddings (will download if not cached)
-        clip_model = SentenceTransformer('clip-ViT-B-32')
+        image_captioner = pipeline("image-to-text", model=CAPTION_MODEL_NAME)
+        caption_model = CAPTION_MODEL_NAME
         
-        # Initialize FAISS index for vector search
-        faiss_index = faiss.IndexFlatL2(512)  # CLIP embedding dimension
+        # Initialize CLIP for image embeddings and the FAISS index for vector search
+        search_index = build_search_index(SentenceTransformer(EMBEDDING_MODEL_NAME), EMBEDDING_MODEL_NAME)
         
         # Initialize LLM for Q&A
         llm = HuggingFaceHub(
@@ -60,8 +259,7 @@ async def lifespan(app: FastAPI):
     # Cleanup
     del object_detector
     del image_captioner
-    del clip_model
-    del faiss_index
+    del search_index
     del llm
 
 # Configure CORS with more permissive settings for development
@@ -72,8 +270,51 @@ origins = [
     "http://127.0.0.1:3001",
 ]
 
+class UploadSizeLimitMiddleware:
+    """Cap upload request bodies at max_bytes.
+
+    Requests with a larger Content-Length are rejected before the body is
+    read; otherwise received bytes are counted as they stream in, so chunked
+    requests without a Content-Length are capped as well.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: set):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request exceeds the {self.max_bytes} byte limit"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": detail})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised while the body is being parsed; FastAPI passes
+                    # HTTPExceptions through, so the client gets a 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
 app = FastAPI(title="Smart Image Insights API", lifespan=lifespan)
 
+# Added before CORSMiddleware so CORS wraps it and 413 responses carry CORS headers
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES, paths={"/analyze"})
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -99,9 +340,154 @@ class QuestionQuery(BaseModel):
     image_id: str
     question: str
 
-@app.post("/analyze")
-async def analyze_images(files: List[UploadFile] = File(...)):
+class ReindexRequest(BaseModel):
+    caption_model: Optional[str] = None
+    embedding_model: Optional[str] = None
+    batch_size: int = REINDEX_BATCH_SIZE
+
+def decode_stored_image(image_id: str):
+    return Image.open(io.BytesIO(base64.b64decode(uploaded_images[image_id]["image"]))).convert("RGB")
+
+def reindex_captions(image_ids: List[str], captioner, model_name: str, batch_size: int):
+    """Recompute captions for one batch and update the stored analyses in place"""
+    images = [decode_stored_image(image_id) for image_id in image_ids]
+    caption_results = captioner(images, batch_size=batch_size)
+    with index_lock:
+        for image_id, caption_result in zip(image_ids, caption_results):
+            entry = uploaded_images[image_id]
+            entry["analysis"]["caption"] = caption_result[0]['generated_text']
+            entry["model_versions"]["caption"] = model_name
+    reindex_state["processed"]["caption"] += len(image_ids)
+
+def reindex_embeddings(image_ids: List[str], target_index: Dict, pending: Optional[Dict], batch_size: int):
+    """Recompute embeddings for one batch and add them to target_index.
+
+    When building a replacement index the new embeddings are parked in
+    pending and only written back to the stored analyses on swap; otherwise
+    the batch is added to the live index and committed immediately.
+    """
+    images = [decode_stored_image(image_id) for image_id in image_ids]
+    embeddings = target_index["clip_model"].encode(images, batch_size=batch_size)
+    with index_lock:
+        target_index["index"].add(np.asarray(embeddings, dtype=np.float32))
+        target_index["image_ids"].extend(image_ids)
+        for image_id, embedding in zip(image_ids, embeddings):
+            if pending is not None:
+                pending[image_id] = embedding.tolist()
+            else:
+                entry = uploaded_images[image_id]
+                entry["analysis"]["embedding"] = embedding.tolist()
+                entry["model_versions"]["embedding"] = target_index["model_name"]
+    reindex_state["processed"]["embedding"] += len(image_ids)
+
+def run_reindex(caption_model_name: str, embedding_model_name: str, batch_size: int):
+    """Bring every stored analysis up to date with the requested models.
+
+    Only stale stages are recomputed, in batches. Captions switch over
+    immediately; a changed embedding model gets a new index built alongside
+    the live one, which keeps serving /search until it is swapped in.
+    """
+    global image_captioner, caption_model, search_index
+    logger.info(f"Starting re-index with caption model {caption_model_name} and embedding model {embedding_model_name}")
+    try:
+        if caption_model_name == caption_model:
+            captioner = image_captioner
+        else:
+            captioner = pipeline("image-to-text", model=caption_model_name)
+            with index_lock:
+                image_captioner = captioner
+                caption_model = caption_model_name
+
+        if search_index["model_name"] == embedding_model_name:
+            target_index = search_index
+            pending = None
+        else:
+            target_index = build_search_index(SentenceTransformer(embedding_model_name), embedding_model_name)
+            pending = {}
+
+        failed = {"caption": set(), "embedding": set()}
+        while True:
+            with index_lock:
+                stale_captions = [
+                    image_id for image_id, entry in uploaded_images.items()
+                    if entry["model_versions"]["caption"] != caption_model_name
+                    and image_id not in failed["caption"]
+                ]
+                stale_embeddings = [
+                    image_id for image_id, entry in uploaded_images.items()
+                    if entry["model_versions"]["embedding"] != embedding_model_name
+                    and image_id not in failed["embedding"]
+                    and (pending is None or image_id not in pending)
+                ]
+                if not stale_captions and not stale_embeddings:
+                    if failed["embedding"]:
+                        # Keep them tagged with their old model so a later re-index
+                        # retries them, but report that search cannot find them
+                        reindex_state["unsearchable"] = sorted(failed["embedding"])
+                        error_msg = (
+                            f"{len(failed['embedding'])} images could not be embedded with "
+                            f"{embedding_model_name} and are not searchable until re-indexed"
+                        )
+                        reindex_state["errors"].append(error_msg)
+                        logger.error(error_msg)
+                    if pending is not None:
+                        # Commit the new embeddings and swap the index in one step
+                        for image_id, embedding in pending.items():
+                            entry = uploaded_images[image_id]
+                            entry["analysis"]["embedding"] = embedding
+                            entry["model_versions"]["embedding"] = embedding_model_name
+                        search_index = target_index
+                    break
+
+            for start in range(0, len(stale_captions), batch_size):
+                batch = stale_captions[start:start + batch_size]
+                try:
+                    reindex_captions(batch, captioner, caption_model_name, batch_size)
+                except Exception as e:
+                    failed["caption"].update(batch)
+                    reindex_state["errors"].append(f"Caption batch failed: {str(e)}")
+                    logger.error(f"Caption re-index batch failed: {str(e)}")
+
+            for start in range(0, len(stale_embeddings), batch_size):
+                batch = stale_embeddings[start:start + batch_size]
+                try:
+                    reindex_embeddings(batch, target_index, pending, batch_size)
+                except Exception as e:
+                    failed["embedding"].update(batch)
+                    reindex_state["errors"].append(f"Embedding batch failed: {str(e)}")
+                    logger.error(f"Embedding re-index batch failed: {str(e)}")
+
+        logger.info(f"Re-index completed: {reindex_state['processed']}")
+    except Exception as e:
+        reindex_state["errors"].append(str(e))
+        logger.error(f"Re-index failed: {str(e)}")
+    finally:
+        reindex_state["running"] = False
+        reindex_state["finished_at"] = time.time()
+
+# /analyze parses its multipart body itself, so describe it for the docs
+ANALYZE_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "files": {"type": "array", "items": {"type": "string", "format": "binary"}}
+                    },
+                    "required": ["files"]
+                }
+            }
+        }
+    }
+}
+
+@app.post("/analyze", openapi_extra=ANALYZE_REQUEST_BODY)
+async def analyze_images(request: Request):
+    files = []
     try:
+        files = await spool_multipart_images(request)
         logger.info(f"Received {len(files)} files for analysis")
         
         if not files:
@@ -112,14 +498,11 @@ async def analyze_images(files: List[UploadFile] = File(...)):
         
         for file in files:
             try:
-                # Read and validate image
-                contents = await file.read()
+                # Decode the image straight from the spooled upload
                 logger.info(f"Processing file: {file.filename}")
                 
                 try:
-                    image = Image.open(io.BytesIO(contents))
-                    if image.format and image.format.upper() not in ['PNG', 'JPEG', 'JPG', 'GIF']:
-                        raise ValueError(f"Unsupported image format: {image.format}")
+                    image = open_spooled_image(file.file)
                 except Exception as e:
                     logger.error(f"Failed to open image {file.filename}: {str(e)}")
                     errors.append(f"Failed to process {file.filename}: {str(e)}")
@@ -146,29 +529,38 @@ async def analyze_images(files: List[UploadFile] = File(...)):
                     logger.info(f"Detected {len(objects)} objects in {file.filename}")
                     
                     # Generate image caption
-                    caption = image_captioner(image)[0]['generated_text']
+                    with index_lock:
+                        captioner, captioner_model = image_captioner, caption_model
+                    caption = captioner(image)[0]['generated_text']
                     logger.info(f"Generated caption for {file.filename}")
                     
-                    # Generate CLIP embedding
-                    embedding = clip_model.encode(image).tolist()
-                    logger.info(f"Generated embedding for {file.filename}")
+                    image_base64 = encode_spooled_base64(file.file)
                     
-                    # Store results
-                    uploaded_images[image_id] = {
-                        "image": base64.b64encode(contents).decode('utf-8'),
-                        "analysis": {
-                            "objects": objects,
-                            "caption": caption,
-                            "embedding": embedding
+                    # Generate CLIP embedding, store results and add it to the FAISS
+                    # index under the lock so a re-index cannot swap the index in between
+                    with index_lock:
+                        embedding = search_index["clip_model"].encode(image).tolist()
+                        logger.info(f"Generated embedding for {file.filename}")
+                        
+                        uploaded_images[image_id] = {
+                            "image": image_base64,
+                            "analysis": {
+                                "objects": objects,
+                                "caption": caption,
+                                "embedding": embedding
+                            },
+                            "model_versions": {
+                                "caption": captioner_model,
+                                "embedding": search_index["model_name"]
+                            }
                         }
-                    }
-                    
-                    # Add embedding to FAISS index
-                    faiss_index.add(np.array([embedding], dtype=np.float32))
+                        
+                        search_index["index"].add(np.array([embedding], dtype=np.float32))
+                        search_index["image_ids"].append(image_id)
                     
                     results.append({
                         "id": image_id,
-                        "imageUrl": f"data:image/jpeg;base64,{base64.b64encode(contents).decode('utf-8')}",
+                        "imageUrl": f"data:image/jpeg;base64,{image_base64}",
                         "objects": objects,
                         "caption": caption
                     })
@@ -197,33 +589,44 @@ async def analyze_images(files: List[UploadFile] = File(...)):
             "errors": errors if errors else None
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Analysis failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for file in files:
+            file.file.close()
 
 @app.post("/search")
 async def search_images(query: SearchQuery):
     try:
-        # Generate query embedding
-        query_embedding = clip_model.encode(query.query)
-        
-        # Search in FAISS index
-        distances, indices = faiss_index.search(
-            np.array([query_embedding], dtype=np.float32),
-            query.top_k
-        )
+        # FAISS does not support searching while a re-index adds to the same
+        # index, so encode and search under the lock
+        with index_lock:
+            # Generate query embedding
+            query_embedding = search_index["clip_model"].encode(query.query)
+            
+            # Search in FAISS index
+            distances, indices = search_index["index"].search(
+                np.array([query_embedding], dtype=np.float32),
+                query.top_k
+            )
+            hits = [
+                (search_index["image_ids"][idx], distance)
+                for idx, distance in zip(indices[0], distances[0])
+                if 0 <= idx < len(search_index["image_ids"])
+            ]
         
         # Get results
         results = []
-        for idx, distance in zip(indices[0], distances[0]):
-            if idx < len(uploaded_images):
-                image_id = list(uploaded_images.keys())[idx]
-                results.append({
-                    "id": image_id,
-                    "image": uploaded_images[image_id]["image"],
-                    "caption": uploaded_images[image_id]["analysis"]["caption"],
-                    "similarity": float(1 / (1 + distance))
-                })
+        for image_id, distance in hits:
+            results.append({
+                "id": image_id,
+                "image": uploaded_images[image_id]["image"],
+                "caption": uploaded_images[image_id]["analysis"]["caption"],
+                "similarity": float(1 / (1 + distance))
+            })
         
         return results
         
@@ -267,6 +670,48 @@ Answer:"""
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/reindex")
+async def start_reindex(request: ReindexRequest, background_tasks: BackgroundTasks):
+    """Recompute stale captions and embeddings in the background"""
+    if reindex_state["running"]:
+        raise HTTPException(status_code=409, detail="A re-index is already running")
+    if request.batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size must be at least 1")
+
+    caption_model_name = request.caption_model or caption_model
+    embedding_model_name = request.embedding_model or search_index["model_name"]
+    reindex_state.update({
+        "running": True,
+        "caption_model": caption_model_name,
+        "embedding_model": embedding_model_name,
+        "processed": {"caption": 0, "embedding": 0},
+        "errors": [],
+        "unsearchable": [],
+        "started_at": time.time(),
+        "finished_at": None
+    })
+    background_tasks.add_task(run_reindex, caption_model_name, embedding_model_name, request.batch_size)
+    return {"status": "started", "caption_model": caption_model_name, "embedding_model": embedding_model_name}
+
+@app.get("/reindex/status")
+async def reindex_status():
+    with index_lock:
+        stale = {"caption": 0, "embedding": 0}
+        if reindex_state["caption_model"]:
+            for entry in uploaded_images.values():
+                if entry["model_versions"]["caption"] != reindex_state["caption_model"]:
+                    stale["caption"] += 1
+                if entry["model_versions"]["embedding"] != reindex_state["embedding_model"]:
+                    stale["embedding"] += 1
+    return {
+        **reindex_state,
+        "stale": stale,
+        "active_models": {
+            "caption": caption_model,
+            "embedding": search_index["model_name"]
+        }
+    }
+
 @app.get("/image/{image_id}")
 async def get_image(image_id: str):
     if image_id not in uploaded_images:
@@ -1,5 +1,6 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 import torch
@@ -10,11 +11,15 @@ import numpy as np
 from transformers import pipeline, AutoFeatureExtractor, AutoProcessor, AutoModel, AutoTokenizer
 from sentence_transformers import SentenceTransformer
 import faiss
+from multipart.multipart import MultipartParser, parse_options_header
+from multipart.exceptions import MultipartParseError
 import os
 from dotenv import load_dotenv
 import uuid
 import logging
 from functools import lru_cache
+import tempfile
+import threading
 import time
 
 # Load environment variables
@@ -24,13 +29,29 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Models used for captioning and embeddings; every stored analysis is tagged
+# with the names that produced it so a re-index can find stale entries
+CAPTION_MODEL_NAME = os.getenv("CAPTION_MODEL", "Salesforce/blip-image-captioning-base")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "clip-ViT-B-32")
+REINDEX_BATCH_SIZE = int(os.getenv("REINDEX_BATCH_SIZE", "16"))
+
+# Upload limits; uploads are streamed into spooled temp files and checked as
+# they arrive so concurrent large uploads don't each hold their whole body in memory
+MAX_FILE_BYTES = int(os.getenv("MAX_UPLOAD_FILE_BYTES", str(10 * 1024 * 1024)))
+MAX_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_BYTES", str(50 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(40_000_000)))
+SPOOL_MAX_MEMORY_BYTES = 1024 * 1024
+UPLOAD_CHUNK_BYTES = 192 * 1024  # Multiple of 3 so base64 chunks need no padding
+HEADER_SNIFF_BYTES = 4 * 1024
+UPLOAD_PATHS = {"/analyze", "/analyze-base64"}
+
 # Global variables for model states
 model_states: Dict = {
     "is_initialized": False,
     "object_detector": None,
     "image_captioner": None,
-    "clip_model": None,
-    "faiss_index": None,
+    "caption_model": CAPTION_MODEL_NAME,
+    "search_index": None,
     "initialization_started": False,
     "initialization_errors": []
 }
@@ -38,6 +59,22 @@ model_states: Dict = {
 # Store uploaded images and their analysis
 uploaded_images = {}
 
+# Guards uploaded_images, the active captioner and the active search index so
+# a background re-index can swap them without racing concurrent uploads
+index_lock = threading.Lock()
+
+# Progress of the background re-index
+reindex_state: Dict = {
+    "running": False,
+    "caption_model": None,
+    "embedding_model": None,
+    "processed": {"caption": 0, "embedding": 0},
+    "errors": [],
+    "unsearchable": [],  # Image IDs left out of the index by the last re-index
+    "started_at": None,
+    "finished_at": None
+}
+
 # Model caching decorators
 @lru_cache(maxsize=1)
 def get_object_detector():
@@ -56,29 +93,375 @@ def get_object_detector():
         raise
 
 @lru_cache(maxsize=1)
-def get_image_captioner():
+def get_image_captioner(model_name: str = CAPTION_MODEL_NAME):
     """Cache the image captioning model"""
     try:
-        logger.info("Loading BLIP model...")
-        return pipeline("image-to-text", model="Salesforce/blip-image-captioning-base")
+        logger.info(f"Loading captioning model {model_name}...")
+        return pipeline("image-to-text", model=model_name)
     except Exception as e:
-        error_msg = f"Error loading BLIP model: {str(e)}"
-        logger.error(error_msg)
-        model_states["initialization_errors"].append(error_msg)
+        # Callers record the error: initialize_models in initialization_errors,
+        # run_reindex in reindex_state
+        logger.error(f"Error loading captioning model {model_name}: {str(e)}")
         raise
 
 @lru_cache(maxsize=1)
-def get_clip_model():
+def get_clip_model(model_name: str = EMBEDDING_MODEL_NAME):
     """Cache the CLIP model"""
     try:
-        logger.info("Loading CLIP model...")
-        return SentenceTransformer('clip-ViT-B-32')
+        logger.info(f"Loading CLIP model {model_name}...")
+        return SentenceTransformer(model_name)
     except Exception as e:
-        error_msg = f"Error loading CLIP model: {str(e)}"
-        logger.error(error_msg)
-        model_states["initialization_errors"].append(error_msg)
+        # Callers record the error: initialize_models in initialization_errors,
+        # run_reindex in reindex_state
+        logger.error(f"Error loading CLIP model {model_name}: {str(e)}")
         raise
 
+def embedding_dimension(clip_model) -> int:
+    """Size of the vectors produced by clip_model.
+
+    CLIP checkpoints load as a single CLIPModel module that does not report a
+    sentence embedding dimension, so encode a probe input instead.
+    """
+    return len(clip_model.encode("dimension probe"))
+
+def build_search_index(clip_model, model_name: str) -> Dict:
+    """Create an empty FAISS index bundled with the model that fills it.
+
+    The bundle is swapped as a whole, so queries are always encoded with the
+    same model as the vectors they are searched against.
+    """
+    index = None
+    if clip_model:
+        index = faiss.IndexFlatL2(embedding_dimension(clip_model))
+    return {
+        "model_name": model_name,
+        "clip_model": clip_model,
+        "index": index,
+        "image_ids": []  # FAISS position -> image ID
+    }
+
+def sniff_image_format(head: bytes) -> str:
+    """Identify a supported image format from its magic bytes"""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    raise ValueError("Unsupported image format")
+
+def check_image_dimensions(head: bytes):
+    """Reject images whose header declares more than MAX_IMAGE_PIXELS"""
+    try:
+        width, height = Image.open(io.BytesIO(head)).size
+    except Exception:
+        # Dimensions lie past the sniffed bytes; open_spooled_image checks them
+        return
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValueError(f"Image is too large: {width}x{height} pixels")
+
+def check_image_header(head: bytes) -> str:
+    """Reject unsupported or oversized images from their first few KB"""
+    image_format = sniff_image_format(head)
+    check_image_dimensions(head)
+    return image_format
+
+async def spool_multipart_images(request: Request) -> List[UploadFile]:
+    """Stream a multipart body into one spooled temp file per file part.
+
+    Each part is checked while it arrives: its header once the first
+    HEADER_SNIFF_BYTES are in, its size on every chunk. An unsupported or
+    oversized image aborts the request before the rest of the body is read.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    uploads: List[UploadFile] = []
+    state = {"part": None, "head": None, "headers": {}, "field": b"", "value": b""}
+
+    def check_head():
+        upload, head = state["part"], state["head"]
+        state["head"] = None
+        try:
+            sniff_image_format(head)
+        except ValueError as e:
+            raise HTTPException(status_code=415, detail=f"{upload.filename}: {str(e)}")
+        try:
+            check_image_dimensions(head)
+        except ValueError as e:
+            raise HTTPException(status_code=413, detail=f"{upload.filename}: {str(e)}")
+
+    def on_part_begin():
+        state["part"] = None
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"] = state["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        # Plain form fields and empty file inputs carry no filename and are skipped
+        if options.get(b"filename"):
+            upload = UploadFile(
+                tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY_BYTES),
+                size=0,
+                filename=options[b"filename"].decode("utf-8", "replace")
+            )
+            uploads.append(upload)
+            state["part"] = upload
+            state["head"] = b""
+
+    def on_part_data(data, start, end):
+        upload = state["part"]
+        if upload is None:
+            return
+        chunk = data[start:end]
+        upload.size += len(chunk)
+        if upload.size > MAX_FILE_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{upload.filename}: file exceeds the {MAX_FILE_BYTES} byte limit"
+            )
+        if state["head"] is not None:
+            state["head"] += chunk
+            if len(state["head"]) >= HEADER_SNIFF_BYTES:
+                check_head()
+        upload.file.write(chunk)
+
+    def on_part_end():
+        # Parts smaller than HEADER_SNIFF_BYTES are checked once complete
+        if state["part"] is not None and state["head"] is not None:
+            check_head()
+        state["part"] = None
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except Exception as e:
+        for upload in uploads:
+            upload.file.close()
+        if isinstance(e, MultipartParseError):
+            raise HTTPException(status_code=400, detail=f"Malformed multipart body: {str(e)}")
+        raise
+    return uploads
+
+def spool_base64(data: str):
+    """Decode a base64 image chunk by chunk into a spooled temp file"""
+    # Drop line breaks so fixed-size slices stay aligned to 4-character groups
+    data = "".join(data.split())
+    if len(data) * 3 // 4 > MAX_FILE_BYTES:
+        raise ValueError(f"Image exceeds the {MAX_FILE_BYTES} byte limit")
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY_BYTES)
+    try:
+        step = UPLOAD_CHUNK_BYTES // 3 * 4
+        for start in range(0, len(data), step):
+            chunk = base64.b64decode(data[start:start + step])
+            if start == 0:
+                check_image_header(chunk[:HEADER_SNIFF_BYTES])
+            spooled.write(chunk)
+    except Exception:
+        spooled.close()
+        raise
+    return spooled
+
+def open_spooled_image(spooled):
+    """Decode an image straight from its spooled file"""
+    spooled.seek(0)
+    image = Image.open(spooled)
+    if image.width * image.height > MAX_IMAGE_PIXELS:
+        raise ValueError(f"Image is too large: {image.width}x{image.height} pixels")
+    image.load()
+    return image
+
+def encode_spooled_base64(spooled) -> str:
+    """Base64-encode a spooled file in chunks into a single string"""
+    spooled.seek(0)
+    chunks = []
+    while True:
+        chunk = spooled.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        chunks.append(base64.b64encode(chunk).decode('utf-8'))
+    return "".join(chunks)
+
+def get_active_captioner():
+    """Return the active captioning pipeline together with its model name"""
+    with index_lock:
+        return model_states["image_captioner"], model_states["caption_model"]
+
+def store_image(image_id: str, image, image_base64: str, objects: List[dict], caption: str, caption_model: Optional[str]):
+    """Embed an image with the active CLIP model and store its analysis.
+
+    Encoding and insertion happen under index_lock so a re-index cannot swap
+    the search index in between.
+    """
+    embedding = []
+    embedding_error = None
+    embedding_model = None
+    with index_lock:
+        search_index = model_states["search_index"]
+        if search_index and search_index["clip_model"]:
+            try:
+                embedding = search_index["clip_model"].encode(image).tolist()
+                search_index["index"].add(np.array([embedding], dtype=np.float32))
+                search_index["image_ids"].append(image_id)
+                embedding_model = search_index["model_name"]
+            except Exception as e:
+                embedding_error = str(e)
+                logger.error(f"Embedding generation failed: {embedding_error}")
+        else:
+            embedding_error = "CLIP model not initialized"
+
+        uploaded_images[image_id] = {
+            "image": image_base64,
+            "analysis": {
+                "objects": objects,
+                "caption": caption,
+                "embedding": embedding
+            },
+            "model_versions": {
+                "caption": caption_model,
+                "embedding": embedding_model
+            }
+        }
+    return embedding, embedding_error
+
+def decode_stored_image(image_id: str):
+    return Image.open(io.BytesIO(base64.b64decode(uploaded_images[image_id]["image"]))).convert("RGB")
+
+def reindex_captions(image_ids: List[str], captioner, caption_model: str, batch_size: int):
+    """Recompute captions for one batch and update the stored analyses in place"""
+    images = [decode_stored_image(image_id) for image_id in image_ids]
+    caption_results = captioner(images, batch_size=batch_size)
+    with index_lock:
+        for image_id, caption_result in zip(image_ids, caption_results):
+            entry = uploaded_images[image_id]
+            entry["analysis"]["caption"] = caption_result[0]['generated_text']
+            entry["model_versions"]["caption"] = caption_model
+    reindex_state["processed"]["caption"] += len(image_ids)
+
+def reindex_embeddings(image_ids: List[str], search_index: Dict, pending: Optional[Dict], batch_size: int):
+    """Recompute embeddings for one batch and add them to search_index.
+
+    When building a replacement index the new embeddings are parked in
+    pending and only written back to the stored analyses on swap; otherwise
+    the batch is added to the live index and committed immediately.
+    """
+    images = [decode_stored_image(image_id) for image_id in image_ids]
+    embeddings = search_index["clip_model"].encode(images, batch_size=batch_size)
+    with index_lock:
+        search_index["index"].add(np.asarray(embeddings, dtype=np.float32))
+        search_index["image_ids"].extend(image_ids)
+        for image_id, embedding in zip(image_ids, embeddings):
+            if pending is not None:
+                pending[image_id] = embedding.tolist()
+            else:
+                entry = uploaded_images[image_id]
+                entry["analysis"]["embedding"] = embedding.tolist()
+                entry["model_versions"]["embedding"] = search_index["model_name"]
+    reindex_state["processed"]["embedding"] += len(image_ids)
+
+def run_reindex(caption_model: str, embedding_model: str, batch_size: int):
+    """Bring every stored analysis up to date with the requested models.
+
+    Only stale stages are recomputed, in batches. Captions switch over
+    immediately; a changed embedding model gets a new index built alongside
+    the live one, which keeps serving /search until it is swapped in.
+    """
+    logger.info(f"Starting re-index with caption model {caption_model} and embedding model {embedding_model}")
+    try:
+        captioner = get_image_captioner(caption_model)
+        with index_lock:
+            model_states["image_captioner"] = captioner
+            model_states["caption_model"] = caption_model
+            live_index = model_states["search_index"]
+
+        if live_index and live_index["clip_model"] and live_index["model_name"] == embedding_model:
+            target_index = live_index
+            pending = None
+        else:
+            target_index = build_search_index(get_clip_model(embedding_model), embedding_model)
+            pending = {}
+
+        failed = {"caption": set(), "embedding": set()}
+        while True:
+            with index_lock:
+                stale_captions = [
+                    image_id for image_id, entry in uploaded_images.items()
+                    if entry["model_versions"]["caption"] != caption_model
+                    and image_id not in failed["caption"]
+                ]
+                stale_embeddings = [
+                    image_id for image_id, entry in uploaded_images.items()
+                    if entry["model_versions"]["embedding"] != embedding_model
+                    and image_id not in failed["embedding"]
+                    and (pending is None or image_id not in pending)
+                ]
+                if not stale_captions and not stale_embeddings:
+                    if failed["embedding"]:
+                        # Keep them tagged with their old model so a later re-index
+                        # retries them, but report that search cannot find them
+                        reindex_state["unsearchable"] = sorted(failed["embedding"])
+                        error_msg = (
+                            f"{len(failed['embedding'])} images could not be embedded with "
+                            f"{embedding_model} and are not searchable until re-indexed"
+                        )
+                        reindex_state["errors"].append(error_msg)
+                        logger.error(error_msg)
+                    if pending is not None:
+                        # Commit the new embeddings and swap the index in one step
+                        for image_id, embedding in pending.items():
+                            entry = uploaded_images[image_id]
+                            entry["analysis"]["embedding"] = embedding
+                            entry["model_versions"]["embedding"] = embedding_model
+                        model_states["search_index"] = target_index
+                    break
+
+            for start in range(0, len(stale_captions), batch_size):
+                batch = stale_captions[start:start + batch_size]
+                try:
+                    reindex_captions(batch, captioner, caption_model, batch_size)
+                except Exception as e:
+                    failed["caption"].update(batch)
+                    reindex_state["errors"].append(f"Caption batch failed: {str(e)}")
+                    logger.error(f"Caption re-index batch failed: {str(e)}")
+
+            for start in range(0, len(stale_embeddings), batch_size):
+                batch = stale_embeddings[start:start + batch_size]
+                try:
+                    reindex_embeddings(batch, target_index, pending, batch_size)
+                except Exception as e:
+                    failed["embedding"].update(batch)
+                    reindex_state["errors"].append(f"Embedding batch failed: {str(e)}")
+                    logger.error(f"Embedding re-index batch failed: {str(e)}")
+
+        logger.info(f"Re-index completed: {reindex_state['processed']}")
+    except Exception as e:
+        reindex_state["errors"].append(str(e))
+        logger.error(f"Re-index failed: {str(e)}")
+    finally:
+        reindex_state["running"] = False
+        reindex_state["finished_at"] = time.time()
+
 # Initialize models in background
 async def initialize_models(background_tasks: BackgroundTasks):
     if not model_states["initialization_started"]:
@@ -99,24 +482,24 @@ async def initialize_models(background_tasks: BackgroundTasks):
                 model_states["object_detector"] = None
 
             try:
-                model_states["image_captioner"] = get_image_captioner()
-                logger.info("BLIP model loaded successfully")
+                model_states["image_captioner"] = get_image_captioner(CAPTION_MODEL_NAME)
+                logger.info("Captioning model loaded successfully")
             except Exception as e:
-                error_msg = f"Failed to load BLIP model: {str(e)}"
+                error_msg = f"Failed to load captioning model: {str(e)}"
                 logger.error(error_msg)
                 model_states["initialization_errors"].append(error_msg)
                 model_states["image_captioner"] = None
 
+            clip_model = None
             try:
-                model_states["clip_model"] = get_clip_model()
+                clip_model = get_clip_model(EMBEDDING_MODEL_NAME)
                 logger.info("CLIP model loaded successfully")
             except Exception as e:
                 error_msg = f"Failed to load CLIP model: {str(e)}"
                 logger.error(error_msg)
                 model_states["initialization_errors"].append(error_msg)
-                model_states["clip_model"] = None
 
-            model_states["faiss_index"] = faiss.IndexFlatL2(512)
+            model_states["search_index"] = build_search_index(clip_model, EMBEDDING_MODEL_NAME)
             model_states["is_initialized"] = True
             
             end_time = time.time()
@@ -128,8 +511,51 @@ async def initialize_models(background_tasks: BackgroundTasks):
             model_states["is_initialized"] = False
             raise HTTPException(status_code=500, detail="Failed to initialize models")
 
+class UploadSizeLimitMiddleware:
+    """Cap upload request bodies at max_bytes.
+
+    Requests with a larger Content-Length are rejected before the body is
+    read; otherwise received bytes are counted as they stream in, so chunked
+    requests without a Content-Length are capped as well.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: set):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request exceeds the {self.max_bytes} byte limit"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": detail})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised while the body is being parsed; FastAPI passes
+                    # HTTPExceptions through, so the client gets a 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
 app = FastAPI(title="Smart Image Insights API")
 
+# Added before CORSMiddleware so CORS wraps it and 413 responses carry CORS headers
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES, paths=UPLOAD_PATHS)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -153,29 +579,53 @@ class ImageBase64Request(BaseModel):
     image: str
     filename: str = "image.jpg"
 
+class ReindexRequest(BaseModel):
+    caption_model: Optional[str] = None
+    embedding_model: Optional[str] = None
+    batch_size: int = REINDEX_BATCH_SIZE
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize models on startup"""
     background_tasks = BackgroundTasks()
     await initialize_models(background_tasks)
 
-@app.post("/analyze")
-async def analyze_images(files: List[UploadFile] = File(...)):
+# /analyze parses its multipart body itself, so describe it for the docs
+ANALYZE_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "files": {"type": "array", "items": {"type": "string", "format": "binary"}}
+                    },
+                    "required": ["files"]
+                }
+            }
+        }
+    }
+}
+
+@app.post("/analyze", openapi_extra=ANALYZE_REQUEST_BODY)
+async def analyze_images(request: Request):
     if not model_states["is_initialized"]:
         error_msg = "Models are still initializing. Please try again in a few moments."
         if model_states["initialization_errors"]:
             error_msg += f" Initialization errors: {', '.join(model_states['initialization_errors'])}"
         raise HTTPException(status_code=503, detail=error_msg)
 
+    files = []
     try:
+        files = await spool_multipart_images(request)
         logger.info(f"Received {len(files)} files for analysis")
         results = []
         errors = []
 
         for file in files:
             try:
-                contents = await file.read()
-                image = Image.open(io.BytesIO(contents))
+                image = open_spooled_image(file.file)
                 
                 # Generate unique ID
                 image_id = str(uuid.uuid4())
@@ -206,11 +656,14 @@ async def analyze_images(files: List[UploadFile] = File(...)):
                 # Image captioning with error handling
                 caption = "Failed to generate caption"
                 caption_error = None
-                if model_states["image_captioner"]:
+                caption_model = None
+                image_captioner, active_caption_model = get_active_captioner()
+                if image_captioner:
                     try:
-                        caption_result = model_states["image_captioner"](image)
+                        caption_result = image_captioner(image)
                         if caption_result and len(caption_result) > 0:
                             caption = caption_result[0]['generated_text']
+                            caption_model = active_caption_model
                         else:
                             caption_error = "Empty caption result"
                     except Exception as e:
@@ -219,29 +672,11 @@ async def analyze_images(files: List[UploadFile] = File(...)):
                 else:
                     caption_error = "Image captioning model not initialized"
 
-                # Generate embedding
-                embedding = []
-                embedding_error = None
-                if model_states["clip_model"]:
-                    try:
-                        embedding = model_states["clip_model"].encode(image).tolist()
-                        model_states["faiss_index"].add(np.array([embedding], dtype=np.float32))
-                    except Exception as e:
-                        embedding_error = str(e)
-                        logger.error(f"Embedding generation failed: {embedding_error}")
-                else:
-                    embedding_error = "CLIP model not initialized"
-
-                # Store results
-                image_base64 = base64.b64encode(contents).decode('utf-8')
-                uploaded_images[image_id] = {
-                    "image": image_base64,
-                    "analysis": {
-                        "objects": objects,
-                        "caption": caption,
-                        "embedding": embedding
-                    }
-                }
+                # Generate embedding and store results
+                image_base64 = encode_spooled_base64(file.file)
+                embedding, embedding_error = store_image(
+                    image_id, image, image_base64, objects, caption, caption_model
+                )
 
                 results.append({
                     "id": image_id,
@@ -263,9 +698,14 @@ async def analyze_images(files: List[UploadFile] = File(...)):
             "errors": errors if errors else None
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Analysis failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for file in files:
+            file.file.close()
 
 @app.post("/search")
 async def search_images(query: SearchQuery):
@@ -273,24 +713,32 @@ async def search_images(query: SearchQuery):
         raise HTTPException(status_code=503, detail="Models are still initializing")
 
     try:
-        # Convert query to embedding
-        query_embedding = model_states["clip_model"].encode([query.query])
-        
-        # Search similar images
-        D, I = model_states["faiss_index"].search(query_embedding, query.top_k)
+        # FAISS does not support searching while a re-index adds to the same
+        # index, so encode and search under the lock
+        with index_lock:
+            search_index = model_states["search_index"]
+
+            # Convert query to embedding
+            query_embedding = search_index["clip_model"].encode([query.query])
+            
+            # Search similar images
+            D, I = search_index["index"].search(np.asarray(query_embedding, dtype=np.float32), query.top_k)
+            hits = [
+                (search_index["image_ids"][i], dist)
+                for dist, i in zip(D[0], I[0])
+                if 0 <= i < len(search_index["image_ids"])  # Check if index is valid
+            ]
         
         # Get results
         results = []
-        for idx, (dist, i) in enumerate(zip(D[0], I[0])):
-            if i < len(uploaded_images):  # Check if index is valid
-                image_id = list(uploaded_images.keys())[i]
-                image_data = uploaded_images[image_id]
-                results.append({
-                    "id": image_id,
-                    "similarity": float(1 / (1 + dist)),  # Convert distance to similarity score
-                    "imageUrl": f"data:image/jpeg;base64,{image_data['image']}",
-                    "analysis": image_data['analysis']
-                })
+        for image_id, dist in hits:
+            image_data = uploaded_images[image_id]
+            results.append({
+                "id": image_id,
+                "similarity": float(1 / (1 + dist)),  # Convert distance to similarity score
+                "imageUrl": f"data:image/jpeg;base64,{image_data['image']}",
+                "analysis": image_data['analysis']
+            })
         
         return {"results": results}
         
@@ -312,10 +760,11 @@ async def analyze_base64_image(request: ImageBase64Request):
         results = []
         errors = []
 
+        spooled = None
         try:
             # Decode base64 image
-            image_data = base64.b64decode(request.image)
-            image = Image.open(io.BytesIO(image_data))
+            spooled = spool_base64(request.image)
+            image = open_spooled_image(spooled)
             
             # Generate unique ID
             image_id = str(uuid.uuid4())
@@ -346,11 +795,14 @@ async def analyze_base64_image(request: ImageBase64Request):
             # Image captioning with error handling
             caption = "Failed to generate caption"
             caption_error = None
-            if model_states["image_captioner"]:
+            caption_model = None
+            image_captioner, active_caption_model = get_active_captioner()
+            if image_captioner:
                 try:
-                    caption_result = model_states["image_captioner"](image)
+                    caption_result = image_captioner(image)
                     if caption_result and len(caption_result) > 0:
                         caption = caption_result[0]['generated_text']
+                        caption_model = active_caption_model
                     else:
                         caption_error = "Empty caption result"
                 except Exception as e:
@@ -359,29 +811,11 @@ async def analyze_base64_image(request: ImageBase64Request):
             else:
                 caption_error = "Image captioning model not initialized"
 
-            # Generate embedding
-            embedding = []
-            embedding_error = None
-            if model_states["clip_model"]:
-                try:
-                    embedding = model_states["clip_model"].encode(image).tolist()
-                    model_states["faiss_index"].add(np.array([embedding], dtype=np.float32))
-                except Exception as e:
-                    embedding_error = str(e)
-                    logger.error(f"Embedding generation failed: {embedding_error}")
-            else:
-                embedding_error = "CLIP model not initialized"
-
-            # Store results
+            # Generate embedding and store results
             image_base64 = request.image
-            uploaded_images[image_id] = {
-                "image": image_base64,
-                "analysis": {
-                    "objects": objects,
-                    "caption": caption,
-                    "embedding": embedding
-                }
-            }
+            embedding, embedding_error = store_image(
+                image_id, image, image_base64, objects, caption, caption_model
+            )
 
             results.append({
                 "id": image_id,
@@ -397,6 +831,9 @@ async def analyze_base64_image(request: ImageBase64Request):
 
         except Exception as e:
             errors.append(f"Failed to process image: {str(e)}")
+        finally:
+            if spooled:
+                spooled.close()
 
         return {
             "results": results,
@@ -407,6 +844,53 @@ async def analyze_base64_image(request: ImageBase64Request):
         logger.error(f"Analysis failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/reindex")
+async def start_reindex(request: ReindexRequest, background_tasks: BackgroundTasks):
+    """Recompute stale captions and embeddings in the background"""
+    if not model_states["is_initialized"]:
+        raise HTTPException(status_code=503, detail="Models are still initializing")
+    if reindex_state["running"]:
+        raise HTTPException(status_code=409, detail="A re-index is already running")
+    if request.batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size must be at least 1")
+
+    caption_model = request.caption_model or model_states["caption_model"]
+    embedding_model = request.embedding_model or (
+        model_states["search_index"]["model_name"] if model_states["search_index"] else EMBEDDING_MODEL_NAME
+    )
+    reindex_state.update({
+        "running": True,
+        "caption_model": caption_model,
+        "embedding_model": embedding_model,
+        "processed": {"caption": 0, "embedding": 0},
+        "errors": [],
+        "unsearchable": [],
+        "started_at": time.time(),
+        "finished_at": None
+    })
+    background_tasks.add_task(run_reindex, caption_model, embedding_model, request.batch_size)
+    return {"status": "started", "caption_model": caption_model, "embedding_model": embedding_model}
+
+@app.get("/reindex/status")
+async def reindex_status():
+    with index_lock:
+        stale = {"caption": 0, "embedding": 0}
+        if reindex_state["caption_model"]:
+            for entry in uploaded_images.values():
+                if entry["model_versions"]["caption"] != reindex_state["caption_model"]:
+                    stale["caption"] += 1
+                if entry["model_versions"]["embedding"] != reindex_state["embedding_model"]:
+                    stale["embedding"] += 1
+        search_index = model_states["search_index"]
+    return {
+        **reindex_state,
+        "stale": stale,
+        "active_models": {
+            "caption": model_states["caption_model"],
+            "embedding": search_index["model_name"] if search_index else None
+        }
+    }
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():